@@ -37,6 +37,15 @@ class Settings(BaseSettings):
     # Google Gemini AI
     GEMINI_API_KEY: Optional[str] = None
     GEMINI_MODEL: str = "gemini-pro"
+    GEMINI_JSON_MODE: bool = False  # Structured JSON output; needs a gemini-1.5+ model
+    GEMINI_SYSTEM_INSTRUCTION: bool = False  # Send SYSTEM_PROMPT as a system instruction; needs a gemini-1.5+ model
+    GEMINI_MAX_OUTPUT_TOKENS: int = 2048  # Model's output limit (gemini-pro: 2048, gemini-1.5+: 8192)
+    GEMINI_BATCH_SIZE: int = 10  # Endpoints documented per Gemini request in /generate/batch
+    GEMINI_MAX_CONCURRENCY: int = 10  # Gemini requests in flight per worker
+    GEMINI_REQUESTS_PER_MINUTE: int = 60  # Request budget per worker (0 disables pacing)
+    GEMINI_TIMEOUT_SECONDS: float = 30.0  # Per-request limit before falling back (batch requests get longer)
+    GEMINI_MAX_RETRIES: int = 5  # Retries on quota, deadline and 503 errors
+    GEMINI_CACHE_SIZE: int = 2048  # Cached responses kept in memory (0 disables)
     
     # Gateway callback
     GATEWAY_URL: str = "http://gateway:8000"
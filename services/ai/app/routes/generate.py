@@ -5,9 +5,15 @@ Documentation generation routes
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
 import logging
 
-from app.services.gemini_service import generate_documentation, DocumentationResult
+from app.services.gemini_service import (
+    generate_documentation,
+    generate_documentation_batch,
+    fallback_documentation,
+    DocumentationResult,
+)
 from app.config import settings
 
 router = APIRouter()
@@ -50,13 +56,10 @@ async def generate(request: GenerateRequest):
         return {
             "success": True,
             "fallback": True,
-            "documentation": {
-                "summary": f"{request.endpoint.method} {request.endpoint.path}",
-                "description": "Documentation generated without AI (API key not configured)",
-                "parameters": [],
-                "request_body": None,
-                "responses": [{"status": 200, "description": "Success"}]
-            },
+            "documentation": fallback_documentation(
+                request.endpoint,
+                "Documentation generated without AI (API key not configured)"
+            ),
             "cost": 0.0
         }
     
@@ -72,49 +75,58 @@ async def generate(request: GenerateRequest):
                 "output": result.output_tokens
             }
         }
+    except asyncio.TimeoutError as e:
+        logger.warning(f"Documentation generation timed out: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Documentation generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _batch_item(endpoint: EndpointInput, result) -> dict:
+    """Shape one endpoint's outcome for the batch response."""
+    if isinstance(result, Exception):
+        return {
+            "path": endpoint.path,
+            "method": endpoint.method,
+            "success": False,
+            "error": str(result)
+        }
+    return {
+        "path": endpoint.path,
+        "method": endpoint.method,
+        "success": True,
+        "documentation": result.documentation,
+        "cost": result.cost
+    }
+
+
 @router.post("/batch")
 async def batch_generate(request: BatchGenerateRequest):
     """
     Generate documentation for multiple endpoints.
-    """
-    results = []
-    total_cost = 0.0
     
-    for endpoint in request.endpoints:
-        try:
-            if settings.GEMINI_API_KEY:
-                result = await generate_documentation(endpoint)
-                results.append({
-                    "path": endpoint.path,
-                    "method": endpoint.method,
-                    "success": True,
-                    "documentation": result.documentation,
-                    "cost": result.cost
-                })
-                total_cost += result.cost
-            else:
-                results.append({
-                    "path": endpoint.path,
-                    "method": endpoint.method,
-                    "success": True,
-                    "fallback": True,
-                    "documentation": {
-                        "summary": f"{endpoint.method} {endpoint.path}",
-                        "description": "No AI key configured"
-                    }
-                })
-        except Exception as e:
-            results.append({
+    Several endpoints are packed into each Gemini request and the requests
+    run concurrently; results keep the request order.
+    """
+    if settings.GEMINI_API_KEY:
+        generated = await generate_documentation_batch(request.endpoints)
+        results = [
+            _batch_item(endpoint, result)
+            for endpoint, result in zip(request.endpoints, generated)
+        ]
+    else:
+        results = [
+            {
                 "path": endpoint.path,
                 "method": endpoint.method,
-                "success": False,
-                "error": str(e)
-            })
+                "success": True,
+                "fallback": True,
+                "documentation": fallback_documentation(endpoint, "No AI key configured")
+            }
+            for endpoint in request.endpoints
+        ]
+    total_cost = sum(r.get("cost", 0.0) for r in results)
     
     return {
         "total": len(results),
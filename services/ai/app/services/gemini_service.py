@@ -2,24 +2,53 @@
 Google Gemini AI Integration Service
 """
 
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
-import json
+from typing import List, Optional, Union
+import random
 import re
+import textwrap
+import time
 
-import google.generativeai as genai
+import orjson
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Initialize Gemini client
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+# google.generativeai, imported and configured on first use (see _load_genai)
+_genai = None
 
+# Per-worker GenerativeModel, built on first use (see _get_model)
+_model = None
 
-@dataclass
+
+def _load_genai():
+    """Import and configure the Gemini SDK the first time it is needed."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+
+def _get_model():
+    """Return this worker's GenerativeModel, constructing it on first use."""
+    global _model
+    if _model is None:
+        genai = _load_genai()
+        if settings.GEMINI_SYSTEM_INSTRUCTION:
+            _model = genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=SYSTEM_PROMPT)
+        else:
+            _model = genai.GenerativeModel(settings.GEMINI_MODEL)
+    return _model
+
+
+@dataclass(slots=True)
 class DocumentationResult:
     """Result of documentation generation."""
     documentation: dict
@@ -48,74 +77,407 @@ Return this exact JSON structure:
 
 Replace the placeholder text with actual documentation. Keep all strings on single lines (no embedded newlines)."""
 
+# Response schema for single-endpoint documentation in JSON mode
+DOCUMENTATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "description": {"type": "string"},
+        "parameters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "in": {"type": "string"},
+                    "type": {"type": "string"},
+                    "required": {"type": "boolean"},
+                    "description": {"type": "string"},
+                },
+                "required": ["name"],
+            },
+        },
+        "request_body": {
+            "type": "object",
+            "nullable": True,
+            "properties": {
+                "content_type": {"type": "string"},
+                "description": {"type": "string"},
+                "example": {"type": "string"},
+            },
+        },
+        "responses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "status": {"type": "integer"},
+                    "description": {"type": "string"},
+                },
+                "required": ["status", "description"],
+            },
+        },
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "auth_required": {"type": "boolean"},
+    },
+    "required": ["summary", "description", "parameters", "responses", "tags", "auth_required"],
+}
 
-async def generate_documentation(endpoint) -> DocumentationResult:
+# Fields a parsed response must have before it is used as documentation
+REQUIRED_DOCUMENTATION_FIELDS = ("summary", "description")
+
+# Response length budgeted per endpoint; GEMINI_TIMEOUT_SECONDS covers this many tokens
+ENDPOINT_MAX_OUTPUT_TOKENS = 1000
+
+# Upper bound on source code characters packed into one multi-endpoint prompt
+BATCH_MAX_CODE_CHARS = 12000
+
+# Stands in for the code of endpoints submitted without a snippet
+NO_CODE_PLACEHOLDER = "(not available - infer from the method, path and file)"
+
+# Longest code snippet sent to Gemini, and how much code to keep above the route
+MAX_SNIPPET_CHARS = 4000
+SNIPPET_CONTEXT_CHARS = 400
+
+# First route declaration in a snippet (decorators, annotations, and router
+# calls given a literal path, so dict.get( or requests.post( do not match)
+_ROUTE_RE = re.compile(
+    r'@\w+\.(?:get|post|put|patch|delete|route)\b'
+    r'|\.(?:get|post|put|patch|delete|all|HandleFunc|GET|POST|PUT|PATCH|DELETE)\s*\(\s*[\'"`]/'
+    r'|@(?:Get|Post|Put|Patch|Delete|Request)Mapping\b'
+    r'|@(?:Get|Post|Put|Patch|Delete)\s*\('
+    r'|\[Http(?:Get|Post|Put|Patch|Delete)\b'
+)
+
+# Markdown code fences (```json ... ```) around a model response
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.MULTILINE)
+
+# Parsed documentation keyed by a hash of the full prompt (LRU order)
+_response_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _cache_key(prompt: str) -> str:
     """
-    Generate documentation for an endpoint using Google Gemini.
+    Content-address a prompt for the response cache.
     
-    Args:
-        endpoint: EndpointInput with path, method, code_snippet
-        
-    Returns:
-        DocumentationResult with generated docs
+    Line endings, trailing whitespace and blank lines are ignored, so
+    snippets that differ only cosmetically share a cache entry.
     """
-    if not settings.GEMINI_API_KEY:
-        raise ValueError("Gemini API key not configured")
+    normalized = "\n".join(line.rstrip() for line in prompt.splitlines() if line.strip())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[dict]:
+    """Return cached documentation for a prompt key, refreshing its recency."""
+    documentation = _response_cache.get(key)
+    if documentation is not None:
+        _response_cache.move_to_end(key)
+    return documentation
+
+
+def _cache_put(key: str, documentation: dict) -> None:
+    """Store documentation, evicting the least recently used entries."""
+    if settings.GEMINI_CACHE_SIZE <= 0:
+        return
+    _response_cache[key] = documentation
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > settings.GEMINI_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+
+def _first_balanced_object(text: str) -> dict:
+    """
+    Decode the brace-balanced JSON object starting at the first "{" in text.
     
-    user_prompt = f"""Generate API documentation for this endpoint:
+    Only the outermost object is considered: if it never closes (a response
+    cut off at the token limit) no nested fragment is returned instead.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No JSON object found in model response")
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    return orjson.loads(text[start:index + 1])
+                except orjson.JSONDecodeError as e:
+                    raise ValueError(f"Malformed JSON object in model response: {e}") from e
+    raise ValueError("Unterminated JSON object in model response")
+
 
-Method: {endpoint.method}
+def _extract_json(text: str) -> dict:
+    """
+    Parse the JSON object in a model response.
+    
+    Tries the raw text first, then the text with markdown fences removed,
+    then the first brace-balanced object embedded in surrounding prose.
+    
+    Raises:
+        ValueError: if no JSON object can be recovered
+    """
+    try:
+        parsed = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        stripped = _FENCE_RE.sub('', text.strip())
+        try:
+            parsed = orjson.loads(stripped)
+        except orjson.JSONDecodeError:
+            parsed = _first_balanced_object(stripped)
+    
+    if not isinstance(parsed, dict):
+        raise ValueError(f"Model response is a JSON {type(parsed).__name__}, not an object")
+    return parsed
+
+
+def _is_documentation(value) -> bool:
+    """Whether a parsed response has the fields needed to document an endpoint."""
+    return isinstance(value, dict) and all(value.get(field) for field in REQUIRED_DOCUMENTATION_FIELDS)
+
+
+def _prepare_snippet(code: str) -> str:
+    """
+    Trim a code snippet to the part worth sending to Gemini.
+    
+    Common indentation, trailing whitespace and repeated blank lines are
+    removed. Snippets longer than MAX_SNIPPET_CHARS are cut to a window
+    around the first route declaration (or the head when none is found),
+    so long files keep the handler instead of their imports.
+    """
+    lines = []
+    for line in textwrap.dedent(code).splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    code = "\n".join(lines).strip("\n")
+    if len(code) <= MAX_SNIPPET_CHARS:
+        return code
+    
+    route = _ROUTE_RE.search(code)
+    start = code.rfind("\n", 0, max(0, route.start() - SNIPPET_CONTEXT_CHARS)) + 1 if route else 0
+    return code[start:start + MAX_SNIPPET_CHARS]
+
+
+def _build_endpoint_details(endpoint, snippet: str) -> str:
+    """Describe one endpoint, with its prepared snippet, for a prompt."""
+    return f"""Method: {endpoint.method}
 Path: {endpoint.path}
 Language: {endpoint.language or 'unknown'}
 File: {endpoint.file_path or 'unknown'}
 
 Code:
-{endpoint.code_snippet}
+{snippet or NO_CODE_PLACEHOLDER}"""
+
+
+def _build_prompt(endpoint, snippet: Optional[str] = None) -> str:
+    """Build the single-endpoint documentation prompt."""
+    if snippet is None:
+        snippet = _prepare_snippet(endpoint.code_snippet)
+    return f"""Generate API documentation for this endpoint:
+
+{_build_endpoint_details(endpoint, snippet)}
 
 Return only valid JSON, no markdown code blocks."""
 
-    try:
-        model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        
-        response = model.generate_content(
-            f"{SYSTEM_PROMPT}\n\n{user_prompt}",
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=1000,
-            )
-        )
-        
-        # Extract text
-        content = response.text
+
+def _build_batch_prompt(endpoints, snippets: List[str]) -> str:
+    """Build one prompt documenting several endpoints, keyed by position."""
+    sections = "\n\n".join(
+        f"### Endpoint {index}\n{_build_endpoint_details(endpoint, snippet)}"
+        for index, (endpoint, snippet) in enumerate(zip(endpoints, snippets))
+    )
+    return f"""Generate API documentation for each of the {len(endpoints)} endpoints below.
+Return ONE JSON object whose keys are the endpoint numbers ("0", "1", ...) and
+whose values each use the JSON structure from your instructions.
+
+{sections}
+
+Return only valid JSON, no markdown code blocks."""
+
+
+class _TokenBucket:
+    """Token bucket pacing Gemini requests to a requests-per-minute budget."""
+    
+    def __init__(self, requests_per_minute: int, burst: int):
+        self._rate = requests_per_minute / 60.0
+        self._capacity = float(max(1, burst))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+    
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        if self._rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+# Shared across all requests handled by this worker
+_rate_limiter = _TokenBucket(settings.GEMINI_REQUESTS_PER_MINUTE, settings.GEMINI_MAX_CONCURRENCY)
+
+# Concurrency limit, created for the event loop it is used on (see _get_request_slots)
+_request_slots: Optional[asyncio.Semaphore] = None
+_request_slots_loop = None
+
+
+def _get_request_slots() -> asyncio.Semaphore:
+    """Return the request semaphore, rebuilt if the running event loop changed."""
+    global _request_slots, _request_slots_loop
+    loop = asyncio.get_running_loop()
+    if _request_slots is None or _request_slots_loop is not loop:
+        _request_slots = asyncio.Semaphore(max(1, settings.GEMINI_MAX_CONCURRENCY))
+        _request_slots_loop = loop
+    return _request_slots
+
+
+async def _generate_content(
+    prompt: str,
+    max_output_tokens: int = ENDPOINT_MAX_OUTPUT_TOKENS,
+    response_schema: Optional[dict] = None,
+) -> str:
+    """
+    Send a prompt to Gemini and return the response text.
+    
+    In JSON mode the response is constrained to response_schema when one is
+    given. SYSTEM_PROMPT is sent as the model's system instruction when
+    GEMINI_SYSTEM_INSTRUCTION is set, and prepended to the prompt otherwise
+    (gemini-pro rejects system instructions). Requests are capped at
+    GEMINI_MAX_CONCURRENCY in flight and paced to GEMINI_REQUESTS_PER_MINUTE;
+    quota errors (429) and 503s are retried with exponential backoff and
+    jitter. Timeouts are not retried, so a request never waits on more than
+    one full-length generation.
+    
+    Raises:
+        asyncio.TimeoutError: if Gemini does not answer within
+            GEMINI_TIMEOUT_SECONDS per ENDPOINT_MAX_OUTPUT_TOKENS requested,
+            or reports its own deadline as exceeded
+    """
+    from google.api_core import exceptions as google_exceptions
+    
+    genai = _load_genai()
+    model = _get_model()
+    if not settings.GEMINI_SYSTEM_INSTRUCTION:
+        prompt = f"{SYSTEM_PROMPT}\n\n{prompt}"
+    generation_config = genai.types.GenerationConfig(
+        temperature=0.3,
+        max_output_tokens=max_output_tokens,
+        response_mime_type="application/json" if settings.GEMINI_JSON_MODE else None,
+        response_schema=response_schema if settings.GEMINI_JSON_MODE else None,
+    )
+    # Longer responses take proportionally longer to generate
+    timeout = settings.GEMINI_TIMEOUT_SECONDS * max(1.0, max_output_tokens / ENDPOINT_MAX_OUTPUT_TOKENS)
+    
+    for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+        try:
+            async with _get_request_slots():
+                await _rate_limiter.acquire()
+                response = await asyncio.wait_for(
+                    model.generate_content_async(
+                        prompt,
+                        generation_config=generation_config
+                    ),
+                    timeout=timeout
+                )
+            return response.text
+        except asyncio.TimeoutError as e:
+            raise asyncio.TimeoutError(f"Gemini did not answer within {timeout:g}s") from e
+        except google_exceptions.DeadlineExceeded as e:
+            raise asyncio.TimeoutError(f"Gemini deadline exceeded: {e}") from e
+        except (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+        ) as e:
+            if attempt >= settings.GEMINI_MAX_RETRIES:
+                raise
+            delay = 2 ** attempt + random.random()
+            logger.warning(f"Gemini request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def fallback_documentation(endpoint, description: str) -> dict:
+    """Minimal documentation for an endpoint that Gemini did not document."""
+    return {
+        "summary": f"{endpoint.method} {endpoint.path}",
+        "description": description,
+        "parameters": [],
+        "request_body": None,
+        "responses": [{"status": 200, "description": "Success"}],
+        "tags": [],
+        "auth_required": False
+    }
+
+
+def _documentation_result(documentation: dict) -> DocumentationResult:
+    """Wrap documentation that needed no separate metered Gemini call."""
+    return DocumentationResult(
+        documentation=documentation,
+        input_tokens=0,
+        output_tokens=0,
+        cost=0.0
+    )
+
+
+async def generate_documentation(endpoint) -> DocumentationResult:
+    """
+    Generate documentation for an endpoint using Google Gemini.
+    
+    Args:
+        endpoint: EndpointInput with path, method, code_snippet
         
-        # Remove markdown code blocks if present
-        content = re.sub(r'^```json\s*', '', content, flags=re.MULTILINE)
-        content = re.sub(r'^```\s*$', '', content, flags=re.MULTILINE)
-        content = content.strip()
+    Returns:
+        DocumentationResult with generated docs
         
-        # Try to extract JSON if embedded in text
-        json_match = re.search(r'\{[\s\S]*\}', content)
-        if json_match:
-            content = json_match.group(0)
+    Raises:
+        asyncio.TimeoutError: if Gemini does not answer in time, so callers
+            keep any documentation they already have
+    """
+    if not settings.GEMINI_API_KEY:
+        raise ValueError("Gemini API key not configured")
+    
+    prompt = _build_prompt(endpoint)
+    
+    cache_key = _cache_key(prompt)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        logger.info(f"Cache hit for {endpoint.method} {endpoint.path}")
+        return _documentation_result(cached)
+
+    try:
+        content = await _generate_content(prompt, response_schema=DOCUMENTATION_SCHEMA)
         
         # Parse response with better error handling
         try:
-            documentation = json.loads(content)
-        except json.JSONDecodeError:
-            # Fallback: try to fix common issues
-            logger.warning("First JSON parse failed, attempting fixes...")
+            documentation = _extract_json(content)
+            if _is_documentation(documentation):
+                _cache_put(cache_key, documentation)
+        except ValueError:
             logger.error(f"Raw response that failed: {content[:500]}")
             
-            # Create minimal fallback documentation
-            documentation = {
-                "summary": f"{endpoint.method} {endpoint.path}",
-                "description": "Documentation generation failed. Please edit manually.",
-                "parameters": [],
-                "request_body": None,
-                "responses": [{"status": 200, "description": "Success"}],
-                "tags": [],
-                "auth_required": False
-            }
+            documentation = fallback_documentation(
+                endpoint, "Documentation generation failed. Please edit manually."
+            )
             logger.warning("Using fallback documentation due to parse error")
         
         logger.info(f"Generated docs for {endpoint.method} {endpoint.path} via Gemini")
@@ -131,3 +493,153 @@ Return only valid JSON, no markdown code blocks."""
         logger.error(f"Gemini API error: {e}")
         raise
 
+
+async def _generate_documentation_chunk(
+    endpoints, snippets: List[str], split_on_failure: bool = True
+) -> List[Union[DocumentationResult, Exception]]:
+    """
+    Document a chunk of endpoints, given their prepared snippets, with a
+    single Gemini request.
+    
+    If the combined response cannot be parsed (typically truncated at the
+    output token limit) the chunk is split in half once and each half retried;
+    after that, and for entries missing from an otherwise good response (or
+    lacking the required fields), endpoints are retried individually through
+    generate_documentation. A timeout or any other API error is returned
+    for every endpoint without further calls.
+    """
+    if len(endpoints) == 1:
+        try:
+            return [await generate_documentation(endpoints[0])]
+        except Exception as e:
+            return [e]
+    
+    try:
+        content = await _generate_content(
+            _build_batch_prompt(endpoints, snippets),
+            max_output_tokens=ENDPOINT_MAX_OUTPUT_TOKENS * len(endpoints),
+        )
+        documented = _extract_json(content)
+    except ValueError as e:
+        logger.warning(f"Batch of {len(endpoints)} endpoints returned an unusable response: {e}")
+        documented = {}
+    except Exception as e:
+        # Timeouts, and quota and availability errors already retried; more calls would only add load
+        logger.error(f"Gemini API error for a batch of {len(endpoints)} endpoints: {e}")
+        return [e] * len(endpoints)
+    
+    results: List[Optional[Union[DocumentationResult, Exception]]] = [None] * len(endpoints)
+    missing = []
+    for index, endpoint in enumerate(endpoints):
+        documentation = documented.get(str(index))
+        if _is_documentation(documentation):
+            _cache_put(_cache_key(_build_prompt(endpoint, snippets[index])), documentation)
+            results[index] = _documentation_result(documentation)
+        else:
+            missing.append(index)
+    
+    if split_on_failure and len(missing) == len(endpoints):
+        middle = len(endpoints) // 2
+        first, second = await asyncio.gather(
+            _generate_documentation_chunk(endpoints[:middle], snippets[:middle], split_on_failure=False),
+            _generate_documentation_chunk(endpoints[middle:], snippets[middle:], split_on_failure=False),
+        )
+        return first + second
+    
+    # Retried concurrently; the request semaphore and _rate_limiter bound the load
+    retried = await asyncio.gather(
+        *(generate_documentation(endpoints[index]) for index in missing),
+        return_exceptions=True,
+    )
+    for index, result in zip(missing, retried):
+        results[index] = result
+    return results
+
+
+def _batch_size() -> int:
+    """
+    Endpoints per multi-endpoint request.
+    
+    GEMINI_BATCH_SIZE, capped so every endpoint keeps its full
+    ENDPOINT_MAX_OUTPUT_TOKENS within the model's GEMINI_MAX_OUTPUT_TOKENS;
+    an oversized batch would be cut off and end up split and retried.
+    """
+    per_request = settings.GEMINI_MAX_OUTPUT_TOKENS // ENDPOINT_MAX_OUTPUT_TOKENS
+    return max(1, min(settings.GEMINI_BATCH_SIZE, per_request))
+
+
+def _pack_batches(snippets: List[str], groups: List[List[int]]) -> List[List[List[int]]]:
+    """
+    Pack endpoint groups into batches of similar code size.
+    
+    Groups are ordered by prepared snippet length and a batch is closed once
+    it holds BATCH_MAX_CODE_CHARS of code or as many endpoints as allowed,
+    so short stubs travel together and long handlers get small batches.
+    """
+    batch_size = _batch_size()
+    ordered = sorted(groups, key=lambda group: len(snippets[group[0]]))
+    
+    batches: List[List[List[int]]] = []
+    current: List[List[int]] = []
+    current_chars = 0
+    for group in ordered:
+        size = len(snippets[group[0]])
+        if current and (len(current) >= batch_size or current_chars + size > BATCH_MAX_CODE_CHARS):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(group)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def generate_documentation_batch(endpoints) -> List[Union[DocumentationResult, Exception]]:
+    """
+    Generate documentation for many endpoints, several per Gemini request.
+    
+    Cached endpoints are answered locally, and an endpoint submitted more
+    than once (same method, path, file and code) is sent only once. The
+    rest are packed into size-bucketed prompts of up to GEMINI_BATCH_SIZE
+    endpoints (fewer if GEMINI_MAX_OUTPUT_TOKENS cannot fit that many
+    answers) which are sent concurrently.
+    
+    Args:
+        endpoints: EndpointInput list
+        
+    Returns:
+        One DocumentationResult (or the raised exception) per endpoint,
+        in input order
+    """
+    if not settings.GEMINI_API_KEY:
+        raise ValueError("Gemini API key not configured")
+    
+    results: List[Optional[Union[DocumentationResult, Exception]]] = [None] * len(endpoints)
+    # Prepared once per endpoint and shared by cache keys, packing and prompts
+    snippets = [""] * len(endpoints)
+    # Endpoints still needing Gemini, grouped by prompt so repeated submissions share
+    # one answer; the same handler code on different paths is still documented per path
+    pending: "OrderedDict[str, List[int]]" = OrderedDict()
+    for index, endpoint in enumerate(endpoints):
+        snippets[index] = _prepare_snippet(endpoint.code_snippet)
+        key = _cache_key(_build_prompt(endpoint, snippets[index]))
+        cached = _cache_get(key)
+        if cached is not None:
+            results[index] = _documentation_result(cached)
+        else:
+            pending.setdefault(key, []).append(index)
+    
+    chunks = _pack_batches(snippets, list(pending.values()))
+    chunk_results = await asyncio.gather(*(
+        _generate_documentation_chunk(
+            [endpoints[group[0]] for group in chunk],
+            [snippets[group[0]] for group in chunk],
+        )
+        for chunk in chunks
+    ))
+    for chunk, documented in zip(chunks, chunk_results):
+        for group, result in zip(chunk, documented):
+            for index in group:
+                results[index] = result
+    
+    return results
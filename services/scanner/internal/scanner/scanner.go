@@ -9,6 +9,7 @@ import (
 	"os"
 	"path/filepath"
 	"regexp"
+	"runtime"
 	"strings"
 	"sync"
 	"time"
@@ -94,6 +95,16 @@ var (
 	}
 )
 
+// Each language's indicators fused into a single alternation, so Stage 1
+// makes one pass over a file instead of one pass per pattern
+var (
+	pythonIndicator = combineIndicators(pythonIndicators)
+	jsIndicator     = combineIndicators(jsIndicators)
+	goIndicator     = combineIndicators(goIndicators)
+	javaIndicator   = combineIndicators(javaIndicators)
+	csharpIndicator = combineIndicators(csharpIndicators)
+)
+
 // Endpoint extraction patterns for Stage 2 (Deep extraction)
 var (
 	// Python patterns
@@ -242,10 +253,13 @@ func cloneRepository(url, branch, token string) (string, error) {
 			return "", fmt.Errorf("failed to create temp dir: %w", err)
 		}
 
-		// Prepare clone options
+		// Prepare clone options - only the tip of one branch is needed for scanning
 		cloneOptions := &git.CloneOptions{
-			URL:      url,
-			Progress: nil, // Silent clone
+			URL:          url,
+			Progress:     nil, // Silent clone
+			Depth:        1,
+			SingleBranch: true,
+			Tags:         git.NoTags,
 		}
 
 		// Add branch if specified
@@ -289,30 +303,33 @@ func cloneRepository(url, branch, token string) (string, error) {
 func hasAPIIndicators(filePath, content string) bool {
 	ext := strings.ToLower(filepath.Ext(filePath))
 
-	var indicators []*regexp.Regexp
+	var indicator *regexp.Regexp
 	switch ext {
 	case ".py":
-		indicators = pythonIndicators
+		indicator = pythonIndicator
 	case ".js", ".ts", ".jsx", ".tsx":
-		indicators = jsIndicators
+		indicator = jsIndicator
 	case ".go":
-		indicators = goIndicators
+		indicator = goIndicator
 	case ".java":
-		indicators = javaIndicators
+		indicator = javaIndicator
 	case ".cs":
-		indicators = csharpIndicators
+		indicator = csharpIndicator
 	default:
 		return false
 	}
 
 	// Quick scan for any indicator
-	for _, pattern := range indicators {
-		if pattern.MatchString(content) {
-			return true
-		}
-	}
+	return indicator.MatchString(content)
+}
 
-	return false
+// combineIndicators joins indicator patterns into one alternation
+func combineIndicators(patterns []*regexp.Regexp) *regexp.Regexp {
+	parts := make([]string, len(patterns))
+	for i, pattern := range patterns {
+		parts[i] = "(?:" + pattern.String() + ")"
+	}
+	return regexp.MustCompile(strings.Join(parts, "|"))
 }
 
 // getCodeFiles recursively finds all code files in a directory
@@ -356,31 +373,40 @@ func getLikelyAPIFiles(rootDir string) ([]string, error) {
 		return nil, err
 	}
 
-	var apiFiles []string
 	totalFiles := len(allFiles)
 
 	log.Printf("🔍 Pre-filtering %d code files for API indicators...", totalFiles)
 
-	for _, filePath := range allFiles {
-		// Check file size
-		info, err := os.Stat(filePath)
-		if err != nil {
-			continue
-		}
-		if info.Size() > MaxFileSize {
-			log.Printf("⚠️  Skipping large file: %s (%d bytes)", filePath, info.Size())
-			continue
-		}
+	// Each file check is independent, so fan the work out over a bounded
+	// pool of workers. Results are recorded by index to keep the output
+	// order identical to the walk order.
+	matched := make([]bool, totalFiles)
+	jobs := make(chan int)
+	workers := runtime.NumCPU()
+	if workers > totalFiles {
+		workers = totalFiles
+	}
 
-		// Read file content
-		content, err := os.ReadFile(filePath)
-		if err != nil {
-			continue
-		}
+	var wg sync.WaitGroup
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range jobs {
+				matched[i] = isLikelyAPIFile(allFiles[i])
+			}
+		}()
+	}
+	for i := range allFiles {
+		jobs <- i
+	}
+	close(jobs)
+	wg.Wait()
 
-		// Stage 1: Check for API indicators
-		if hasAPIIndicators(filePath, string(content)) {
-			apiFiles = append(apiFiles, filePath)
+	var apiFiles []string
+	for i, ok := range matched {
+		if ok {
+			apiFiles = append(apiFiles, allFiles[i])
 		}
 	}
 
@@ -391,6 +417,28 @@ func getLikelyAPIFiles(rootDir string) ([]string, error) {
 	return apiFiles, nil
 }
 
+// isLikelyAPIFile reads a single file and checks it for API indicators
+func isLikelyAPIFile(filePath string) bool {
+	// Check file size
+	info, err := os.Stat(filePath)
+	if err != nil {
+		return false
+	}
+	if info.Size() > MaxFileSize {
+		log.Printf("⚠️  Skipping large file: %s (%d bytes)", filePath, info.Size())
+		return false
+	}
+
+	// Read file content
+	content, err := os.ReadFile(filePath)
+	if err != nil {
+		return false
+	}
+
+	// Stage 1: Check for API indicators
+	return hasAPIIndicators(filePath, string(content))
+}
+
 // StartScan begins scanning a repository
 func StartScan(scanID, url, branch, token string) {
 	// Initialize scan status